@@ -1,8 +1,13 @@
 import datetime
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+import numpy as np
+import orjson
 import requests
-from shapely.geometry import Polygon
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import s1bursts
 
@@ -10,20 +15,28 @@ import s1bursts
 with open('burst_locations_by_id.json') as f:
     BURST_MAP = json.load(f)
 
+# shared across queries so CMR connections are kept alive between calls
+CMR_SESSION = requests.Session()
+CMR_SESSION.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=8,
+                                          max_retries=Retry(total=3, backoff_factor=0.3)))
+CMR_SESSION.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
 
 def cmr_query(params):
-    session = requests.Session()
     cmr_url = 'https://cmr.earthdata.nasa.gov/search/granules.umm_json'
-    headers = {}
     products = []
 
-    while True:
-        response = session.get(cmr_url, params=params, headers=headers)
-        response.raise_for_status()
-        products.extend([item['umm'] for item in response.json()['items']])
-        if 'CMR-Search-After' not in response.headers:
-            break
-        headers = {'CMR-Search-After': response.headers['CMR-Search-After']}
+    # request the next page as soon as its search-after header arrives, so parsing overlaps the next download
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(CMR_SESSION.get, cmr_url, params=params)
+        while future:
+            response = future.result()
+            response.raise_for_status()
+            future = None
+            if 'CMR-Search-After' in response.headers:
+                headers = {'CMR-Search-After': response.headers['CMR-Search-After']}
+                future = executor.submit(CMR_SESSION.get, cmr_url, params=params, headers=headers)
+            products.extend([item['umm'] for item in orjson.loads(response.content)['items']])
 
     return products
 
@@ -43,6 +56,94 @@ def get_galapagos_cmr_slcs():
     return cmr_query(params)
 
 
+# burst fields written to the UMM additional attributes, each as a single stringified value
+BURST_ATTRIBUTES = (
+    ('ANNOTATION_PATH', 'annotation_path'),
+    ('AZIMUTH_FRAME_RATE', 'azimuth_frame_rate'),
+    ('AZIMUTH_STEER_RATE', 'azimuth_steer_rate'),
+    ('AZIMUTH_TIME_INTERVAL', 'azimuth_time_interval'),
+    ('BURST_ANX', 'burst_anx'),
+    ('BURST_ANX_DELTA', 'burst_anx_delta'),
+    ('BURST_INDEX', 'burst_index'),
+    ('BYTE_LENGTH', 'byte_length'),
+    ('BYTE_OFFSET', 'byte_offset'),
+    ('DATA_OFFSET', 'data_offset'),
+    ('DOPPLER', 'doppler'),
+    ('FIRST_VALID_LINE', 'first_valid_line'),
+    ('FIRST_VALID_SAMPLE', 'first_valid_sample'),
+    ('IW2_MID_RANGE', 'iw2_mid_range'),
+    ('LAST_VALID_LINE', 'last_valid_line'),
+    ('LAST_VALID_SAMPLE', 'last_valid_sample'),
+    ('LINES', 'lines'),
+    ('MEASUREMENT_PATH', 'measurement_path'),
+    ('OPERA_ID', 'opera_id'),
+    ('PRF_RAW_DATA', 'prf_raw_data'),
+    ('RADAR_CENTER_FREQUENCY', 'radar_center_frequency'),
+    ('RANGE_BANDWIDTH', 'range_bandwidth'),
+    ('RANGE_CHIRP_RATE', 'range_chirp_rate'),
+    ('RANGE_PIXEL_SPACING', 'range_pixel_spacing'),
+    ('RANGE_SAMPLING_RATE', 'range_sampling_rate'),
+    ('RANGE_WINDOW_COEFFICIENT', 'range_window_coefficient'),
+    ('RANGE_WINDOW_TYPE', 'range_window_type'),
+    ('RANK', 'rank'),
+    ('SAFE_NAME', 'safe_name'),
+    ('SAFE_URL', 'safe_url'),
+    ('SAMPLES', 'samples'),
+    ('SLANT_RANGE_TIME', 'slant_range_time'),
+    ('SLC_START_ANX', 'slc_start_anx'),
+    ('STARTING_RANGE', 'starting_range'),
+    ('SWATH_INDEX', 'swath_index'),
+    ('WAVELENGTH', 'wavelength'),
+)
+
+
+# strips the date and time separators from an ISO timestamp, e.g. 2021-11-11T12:00:00 -> 20211111T120000
+COMPACT_DATETIME_TABLE = str.maketrans('', '', '-:')
+
+# parts of the UMM record that never change between bursts, built once and shared by every record
+UMM_COLLECTION_REFERENCE = {
+    'ShortName': 'S1_SLC_BURSTS',
+    'Version': '1',
+}
+UMM_PLATFORMS = {
+    platform: [
+        {
+            'ShortName': f'Sentinel-1{platform[-1]}',
+            'Instruments': [
+                {
+                    'ShortName': 'C-SAR',
+                },
+            ],
+        },
+    ]
+    for platform in ('S1A', 'S1B', 'S1C', 'S1D')
+}
+UMM_METADATA_SPECIFICATION = {
+    'URL': 'https://cdn.earthdata.nasa.gov/umm/granule/v1.6.4',
+    'Name': 'UMM-G',
+    'Version': '1.6.4',
+}
+
+
+def polygon_centroid(points):
+    # closed-form (shoelace) centroid, same result as shapely's Polygon.centroid without building a GEOS geometry
+    coords = np.array([[point['Longitude'], point['Latitude']] for point in points])
+    x, y = coords[:, 0], coords[:, 1]
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y_next - x_next * y
+    area = 0.5 * cross.sum()
+    center_x = ((x + x_next) * cross).sum() / (6 * area)
+    center_y = ((y + y_next) * cross).sum() / (6 * area)
+    return float(center_x), float(center_y)
+
+
+@lru_cache(maxsize=None)
+def get_burst_info(burst_key):
+    # burst ids repeat across every SLC in a stack, so each id's footprint is processed only once
+    points = BURST_MAP[burst_key]
+    return {'points': points, 'centroid': polygon_centroid(points)}
+
+
 def build_attr(name, value):
     attr = {
         'Name': name,
@@ -57,11 +158,15 @@ def build_attr(name, value):
 def generate_umm(slc, burst):
     now = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
 
-    swath = burst.absolute_burst_id.split('_')[-1]
-    granule_ur = f'S1_SLC_{burst.sensing_start.split(".")[0].replace("-", "").replace(":", "")}_{burst.polarization.upper()}_{burst.relative_burst_id:06}_{swath}'
+    swath = burst.absolute_burst_id.rpartition('_')[2]
+    polarization = burst.polarization.upper()
+    burst_key = f'{burst.relative_burst_id:06}_{swath}'
+    compact_start = burst.sensing_start.partition('.')[0].translate(COMPACT_DATETIME_TABLE)
+    granule_ur = f'S1_SLC_{compact_start}_{polarization}_{burst_key}'
 
-    points = BURST_MAP[f'{burst.relative_burst_id:06}_{swath}']
-    polygon = Polygon([[point['Longitude'], point['Latitude']] for point in points])
+    burst_info = get_burst_info(burst_key)
+    points = burst_info['points']
+    center_x, center_y = burst_info['centroid']
 
     slc_attribute_names = [
         'ASCENDING_DESCENDING',
@@ -78,48 +183,17 @@ def generate_umm(slc, burst):
 
     additional_attributes.append(build_attr('PROCESSING_TYPE', 'S1_SLC_BURSTS'))
     additional_attributes.append(build_attr('GROUP_ID', granule_ur))
-    additional_attributes.append(build_attr('POLARIZATION', burst.polarization.upper()))
+    additional_attributes.append(build_attr('POLARIZATION', polarization))
     additional_attributes.append(build_attr('RELATIVE_BURST_ID', burst.relative_burst_id))
     additional_attributes.append(build_attr('SWATH', swath))
     additional_attributes.append(build_attr('ASC_NODE_TIME', burst.sensing_start))
-    additional_attributes.append(build_attr('CENTER_LON', polygon.centroid.x))
-    additional_attributes.append(build_attr('CENTER_LAT', polygon.centroid.y))
-
-    additional_attributes.append(build_attr('ANNOTATION_PATH', burst.annotation_path))
-    additional_attributes.append(build_attr('AZIMUTH_FRAME_RATE', str(burst.azimuth_frame_rate)))
-    additional_attributes.append(build_attr('AZIMUTH_STEER_RATE', burst.azimuth_steer_rate))
-    additional_attributes.append(build_attr('AZIMUTH_TIME_INTERVAL', burst.azimuth_time_interval))
-    additional_attributes.append(build_attr('BURST_ANX', burst.burst_anx))
-    additional_attributes.append(build_attr('BURST_ANX_DELTA', burst.burst_anx_delta))
-    additional_attributes.append(build_attr('BURST_INDEX', burst.burst_index))
-    additional_attributes.append(build_attr('BYTE_LENGTH', burst.byte_length))
-    additional_attributes.append(build_attr('BYTE_OFFSET', burst.byte_offset))
-    additional_attributes.append(build_attr('DOPPLER', str(burst.doppler)))
-    additional_attributes.append(build_attr('FIRST_VALID_LINE', burst.first_valid_line))
-    additional_attributes.append(build_attr('FIRST_VALID_SAMPLE', burst.first_valid_sample))
-    additional_attributes.append(build_attr('IW2_MID_RANGE', burst.iw2_mid_range))
-    additional_attributes.append(build_attr('LAST_VALID_LINE', burst.last_valid_line))
-    additional_attributes.append(build_attr('LAST_VALID_SAMPLE', burst.last_valid_sample))
-    additional_attributes.append(build_attr('LINES', burst.lines))
-    additional_attributes.append(build_attr('MEASUREMENT_PATH', burst.measurement_path))
-    additional_attributes.append(build_attr('OPERA_ID', burst.opera_id))
-    additional_attributes.append(build_attr('PRF_RAW_DATA', burst.prf_raw_data))
-    additional_attributes.append(build_attr('RADAR_CENTER_FREQUENCY', burst.radar_center_frequency))
-    additional_attributes.append(build_attr('RANGE_BANDWIDTH', burst.range_bandwidth))
-    additional_attributes.append(build_attr('RANGE_CHIRP_RATE', burst.range_chirp_rate))
-    additional_attributes.append(build_attr('RANGE_PIXEL_SPACING', burst.range_pixel_spacing))
-    additional_attributes.append(build_attr('RANGE_SAMPLING_RATE', burst.range_sampling_rate))
-    additional_attributes.append(build_attr('RANGE_WINDOW_COEFFICIENT', burst.range_window_coefficient))
-    additional_attributes.append(build_attr('RANGE_WINDOW_TYPE', burst.range_window_type))
-    additional_attributes.append(build_attr('RANK', burst.rank))
-    additional_attributes.append(build_attr('SAFE_NAME', burst.safe_name))
-    additional_attributes.append(build_attr('SAFE_URL', burst.safe_url))
-    additional_attributes.append(build_attr('SAMPLES', burst.samples))
-    additional_attributes.append(build_attr('SLANT_RANGE_TIME', burst.slant_range_time))
-    additional_attributes.append(build_attr('SLC_START_ANX', burst.slc_start_anx))
-    additional_attributes.append(build_attr('STARTING_RANGE', burst.starting_range))
-    additional_attributes.append(build_attr('SWATH_INDEX', burst.swath_index))
-    additional_attributes.append(build_attr('WAVELENGTH', burst.wavelength))
+    additional_attributes.append(build_attr('CENTER_LON', center_x))
+    additional_attributes.append(build_attr('CENTER_LAT', center_y))
+
+    # every field is a scalar or is stringified as a whole, so build_attr's list handling isn't needed
+    additional_attributes.extend(
+        {'Name': name, 'Values': [str(getattr(burst, attribute))]} for name, attribute in BURST_ATTRIBUTES
+    )
 
     umm = {
         'TemporalExtent': {
@@ -154,10 +228,7 @@ def generate_umm(slc, burst):
                 'Type': 'Update',
             },
         ],
-        'CollectionReference': {
-            'ShortName': 'S1_SLC_BURSTS',
-            'Version': '1',
-        },
+        'CollectionReference': UMM_COLLECTION_REFERENCE,
         'RelatedUrls': [
             {
                 'URL': f'https://asj-dev.s3.us-west-2.amazonaws.com/bursts/data/{granule_ur}.tiff',
@@ -180,33 +251,26 @@ def generate_umm(slc, burst):
                 },
             ],
         },
-        'Platforms': [
-            {
-                'ShortName': 'Sentinel-1A' if burst.platform == 'S1A' else 'Sentinel-1B',
-                'Instruments': [
-                    {
-                        'ShortName': 'C-SAR',
-                    },
-                ],
-            },
-        ],
-        'MetadataSpecification': {
-            'URL': 'https://cdn.earthdata.nasa.gov/umm/granule/v1.6.4',
-            'Name': 'UMM-G',
-            'Version': '1.6.4',
-        },
+        'Platforms': UMM_PLATFORMS[burst.platform],
+        'MetadataSpecification': UMM_METADATA_SPECIFICATION,
     }
     return umm
 
 
+def write_umm(slc, burst, out_dir='umm'):
+    umm = generate_umm(slc, burst)
+    with open(f'{out_dir}/{umm["GranuleUR"]}.json', 'wb') as f:
+        f.write(orjson.dumps(umm, option=orjson.OPT_INDENT_2))
+    return umm['GranuleUR']
+
+
 if __name__ == '__main__':
     cmr_slcs = get_galapagos_cmr_slcs()
     urls = [slc['RelatedUrls'][0]['URL'] for slc in cmr_slcs]
     burst_list = s1bursts.get_burst_metadata(urls, threads=20)
 
-    for burst in burst_list:
-        slc = [slc for slc in cmr_slcs if f"{slc['DataGranule']['Identifiers'][0]['Identifier']}.SAFE" == burst.safe_name][0]
-        umm = generate_umm(slc, burst)
-        print(umm['GranuleUR'])
-        with open(f'umm/{umm["GranuleUR"]}.json', 'w') as f:
-            json.dump(umm, f, indent=2)
+    slcs_by_safe_name = {f"{slc['DataGranule']['Identifiers'][0]['Identifier']}.SAFE": slc for slc in cmr_slcs}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        granule_urs = executor.map(lambda x: write_umm(slcs_by_safe_name[x.safe_name], x), burst_list)
+        for granule_ur in granule_urs:
+            print(granule_ur)
@@ -1,9 +1,34 @@
-import fsspec
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 import xarray as xr
+import zarr
+from fsspec.utils import merge_offset_ranges
+from numcodecs import Blosc
 from pqdm.threads import pqdm
 
 from s1bursts import utils
 
+# int16-derived SAR samples have strongly correlated bit planes, so bitshuffle + fast zstd compresses well and cheaply
+ZARR_COMPRESSOR = Blosc(cname='zstd', clevel=1, shuffle=Blosc.BITSHUFFLE)
+# Zarr stacks are written with the zarr-python 2 API (create_dataset with a numcodecs compressor), which zarr 3 rejects
+ZARR_MAJOR_VERSION = int(zarr.__version__.split('.')[0])
+# byte ranges in the same SAFE closer than this are fetched as one request, the wasted gap is cheaper than a round trip
+MAX_RANGE_GAP = 2 ** 20
+# cap on a merged request so adjacent bursts still download concurrently instead of as one huge serial GET
+MAX_RANGE_BLOCK = 32 * 2 ** 20
+
+
+@lru_cache(maxsize=8)
+def get_line_sample_coords(n_lines, n_samples):
+    # every burst in a stack shares a shape, so these are built once and shared read-only between arrays
+    lines, samples = np.arange(n_lines), np.arange(n_samples)
+    lines.flags.writeable = False
+    samples.flags.writeable = False
+    return lines, samples
+
 
 def burst_numpy_to_xarray(item, array):
     n_lines, n_samples = array.shape
@@ -13,46 +38,145 @@ def burst_numpy_to_xarray(item, array):
     properties['datetime'] = utils.convert_dt(item.datetime)
 
     dims = ('line', 'sample')
-    coords = (range(n_lines), range(n_samples))
+    coords = get_line_sample_coords(n_lines, n_samples)
     coords = {key: value for key, value in zip(dims, coords)}
 
     burst_data_array = xr.DataArray(array, coords=coords, dims=dims, attrs=properties)
     return burst_data_array
 
 
-def edl_download_burst(item, auth, polarization='VV'):
+def get_burst_byte_range(asset, auth):
+    data_offset = asset.get('data_offset')
+    if data_offset is None:
+        data_offset = utils.get_remote_data_offset(asset['href'], asset['interior_path'], auth)
+    if data_offset is None:
+        return None
+
+    start = data_offset + asset['byte_offset']
+    return start, start + asset['byte_length']
+
+
+def read_burst_bytes(http_fs, asset, byte_range):
+    if byte_range is None:
+        # the member is compressed, so it has to go through the slower zip filesystem path
+        return utils.read_zip_member_range(http_fs, asset['href'], asset['interior_path'], asset['byte_offset'],
+                                           asset['byte_length'])
+    return http_fs.cat_file(asset['href'], start=byte_range[0], end=byte_range[1])
+
+
+def edl_download_burst_numpy(item, auth, polarization='VV'):
     asset = item.assets[polarization].to_dict()
     lines, samples = asset['lines'], asset['samples']
-    byte_offset, byte_length = asset['byte_offset'], asset['byte_length']
-    storage_options = {'https': {'client_kwargs': {'trust_env': True, 'auth': auth}}}
-
-    http_fs = fsspec.filesystem('https', **storage_options['https'])
-    with http_fs.open(asset['href']) as http_f:
-        zip_fs = fsspec.filesystem('zip', fo=http_f)
-        with zip_fs.open(asset['interior_path']) as f:
-            # burst_bytes = f.read()[byte_offset:byte_offset + byte_length]  # downloads swath @40mb/s
+    http_fs = utils.get_https_filesystem(auth)
 
-            f.seek(byte_offset)  # downloads burst @15mb/s
-            burst_bytes = f.read(byte_length)
+    # single range request for a stored burst, no need to read through the zip filesystem
+    burst_bytes = read_burst_bytes(http_fs, asset, get_burst_byte_range(asset, auth))
 
     array = utils.burst_bytes_to_numpy(burst_bytes, (lines, samples))
+    return array
+
+
+def edl_download_burst(item, auth, polarization='VV'):
+    array = edl_download_burst_numpy(item, auth, polarization)
     burst_data_array = burst_numpy_to_xarray(item, array)
     return burst_data_array
 
 
-def edl_download_stack(item_list, polarization='VV', threads=None):
-    auth = utils.get_netrc_auth()
+def fetch_byte_ranges(http_fs, urls, starts, ends, batch_size):
+    # bursts from the same SAFE are often adjacent, so merge their ranges into fewer requests and slice them back apart
+    merged_urls, merged_starts, merged_ends = merge_offset_ranges(
+        urls, starts, ends, max_gap=MAX_RANGE_GAP, max_block=MAX_RANGE_BLOCK
+    )
+    merged_bytes = http_fs.cat_ranges(merged_urls, merged_starts, merged_ends, batch_size=batch_size, on_error='raise')
+
+    merged_by_url = defaultdict(list)
+    for url, start, end, data in zip(merged_urls, merged_starts, merged_ends, merged_bytes):
+        merged_by_url[url].append((start, end, memoryview(data)))
+
+    range_bytes = []
+    for url, start, end in zip(urls, starts, ends):
+        merged_start, _, data = next(x for x in merged_by_url[url] if x[0] <= start and end <= x[1])
+        range_bytes.append(data[start - merged_start:end - merged_start])
+    return range_bytes
+
 
+def decode_bursts_into(burst_bytes_list, out):
+    # decode straight into the stack, no per-burst arrays or DataArrays to copy later
+    for burst_bytes, burst_out in zip(burst_bytes_list, out):
+        utils.burst_bytes_to_numpy(burst_bytes, burst_out.shape, out=burst_out)
+
+
+def get_stack_coords(item_list, n_lines, n_samples):
+    ids = [x.id for x in item_list]
+    dates = [x.datetime.replace(tzinfo=None) for x in item_list]
+    lines, samples = get_line_sample_coords(n_lines, n_samples)
+    coords = {'time': dates, 'line': lines, 'sample': samples, 'id': ('time', ids)}
+    return coords
+
+
+def edl_download_burst_to_zarr(item, auth, polarization, zarr_array, time_index):
+    zarr_array[time_index] = edl_download_burst_numpy(item, auth, polarization)
+
+
+def edl_download_stack_to_zarr(item_list, zarr_path, auth, polarization='VV', threads=None):
+    if ZARR_MAJOR_VERSION >= 3:
+        raise ImportError(f'Writing Zarr stacks requires zarr<3, but zarr {zarr.__version__} is installed')
+
+    asset = item_list[0].assets[polarization].to_dict()
+    n_lines, n_samples = asset['lines'], asset['samples']
+
+    # one chunk per burst so each download is written (and later read) independently of the others
+    store = zarr.open_group(zarr_path, mode='w')
+    stack = store.create_dataset(polarization, shape=(len(item_list), n_lines, n_samples),
+                                 chunks=(1, n_lines, n_samples), dtype=np.csingle, compressor=ZARR_COMPRESSOR)
+    stack.attrs['_ARRAY_DIMENSIONS'] = ['time', 'line', 'sample']
+    xr.Dataset(coords=get_stack_coords(item_list, n_lines, n_samples)).to_zarr(zarr_path, mode='a')
+
+    args = [(x, auth, polarization, stack, i) for i, x in enumerate(item_list)]
     if threads:
-        args = [(x, auth, polarization) for x in item_list]
-        data_arrays = pqdm(args, edl_download_burst, n_jobs=threads, argument_type="args")
+        # nothing is returned to check, so a failed burst must raise rather than leave its slice unwritten
+        pqdm(args, edl_download_burst_to_zarr, n_jobs=threads, argument_type="args", exception_behaviour='immediate')
     else:
-        data_arrays = [edl_download_burst(x, auth, polarization) for x in item_list]
+        [edl_download_burst_to_zarr(*x) for x in args]
+
+    stack_dataset = xr.open_zarr(zarr_path)
+    return stack_dataset
+
+
+def edl_download_stack(item_list, polarization='VV', threads=None, zarr_path=None):
+    auth = utils.get_netrc_auth()
+
+    if zarr_path:
+        return edl_download_stack_to_zarr(item_list, zarr_path, auth, polarization, threads)
+
+    # fetch `threads` bursts at a time as concurrent range requests on fsspec's aiohttp event loop
+    http_fs = utils.get_https_filesystem(auth)
+    asset = item_list[0].assets[polarization].to_dict()
+    n_lines, n_samples = asset['lines'], asset['samples']
+    stack = np.empty((len(item_list), n_lines, n_samples), dtype=np.csingle)
+
+    # numpy releases the GIL while casting, so one decoder thread overlaps decoding a batch with fetching the next
+    batch_size = threads if threads else 1
+    pending = None
+    with ThreadPoolExecutor(max_workers=1) as decoder:
+        for i in range(0, len(item_list), batch_size):
+            batch = item_list[i:i + batch_size]
+            assets = [x.assets[polarization].to_dict() for x in batch]
+            byte_ranges = [get_burst_byte_range(x, auth) for x in assets]
+            ranged = [(x, y) for x, y in zip(assets, byte_ranges) if y is not None]
+            ranged_bytes = iter(fetch_byte_ranges(http_fs, [x['href'] for x, _ in ranged], [y[0] for _, y in ranged],
+                                                  [y[1] for _, y in ranged], batch_size))
+            batch_bytes = [next(ranged_bytes) if y is not None else read_burst_bytes(http_fs, x, y)
+                           for x, y in zip(assets, byte_ranges)]
+
+            # wait on the previous batch so at most two batches of raw bytes are held at once
+            if pending:
+                pending.result()
+            pending = decoder.submit(decode_bursts_into, batch_bytes, stack[i:i + len(batch)])
 
-    ids = [x.attrs['id'] for x in data_arrays]
-    dates = [utils.convert_dt(x.attrs['datetime']) for x in data_arrays]
-    n_lines, n_samples = data_arrays[0].data.shape
-    coords = {'time': dates, 'line': range(n_lines), 'sample': range(n_samples)}
+        if pending:
+            pending.result()
 
-    stack_dataset = xr.Dataset({k: v for k, v in zip(ids, data_arrays)}, coords=coords)
+    coords = get_stack_coords(item_list, n_lines, n_samples)
+    stack_dataset = xr.Dataset({polarization: (('time', 'line', 'sample'), stack)}, coords=coords)
     return stack_dataset
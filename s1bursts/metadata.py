@@ -1,34 +1,44 @@
 import os
 import re
-import xml.etree.ElementTree as ET
 import zipfile
+from collections import defaultdict
 from datetime import timedelta
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from itertools import product
 from pathlib import Path
 
 import fsspec
+import geopandas as gpd
 import numpy as np
+import orjson
 import pandas as pd
 import pystac
+from lxml import etree as ET
 from pqdm.threads import pqdm
 from pystac.extensions import sat, sar
 from shapely import geometry
 
 from s1bursts import utils
 
+MEASUREMENT_PATTERN = re.compile(r'^\./measurement/s1.*tiff$')
+ANNOTATION_PATTERN = re.compile(r'^\./annotation/s1.*xml$')
+SWATH_POL_PATTERN = re.compile(r's1.-iw(\d)-slc-(\w+)-')
+
 
 class SLCMetadata:
-    def __init__(self, safe_url, manifest, annotations):
+    def __init__(self, safe_url, manifest, annotations, data_offsets=None):
         self.safe_url = safe_url
         self.manifest = manifest
         self.annotations = annotations
-        self.safe_name = Path(safe_url).with_suffix('.SAFE').name
+        self.data_offsets = data_offsets if data_offsets else {}
+        self.safe_name = utils.get_safe_name(safe_url)
         self.platform = self.safe_name[0:3].upper()
 
         self.file_paths = [x.attrib['href'] for x in self.manifest.findall('.//fileLocation')]
-        self.measurement_paths = [x[2:] for x in self.file_paths if re.search('^\./measurement/s1.*tiff$', x)]
+        self.measurement_paths = [x[2:] for x in self.file_paths if MEASUREMENT_PATTERN.search(x)]
         self.measurement_paths.sort()
+        self.annotation_index = self.index_by_swath_and_polarization(self.annotations.keys())
+        self.measurement_index = self.index_by_swath_and_polarization(self.measurement_paths)
 
         self.relative_orbit = int(self.manifest.findall('.//{*}relativeOrbitNumber')[0].text)
         self.absolute_orbit = int(self.manifest.findall('.//{*}orbitNumber')[0].text)
@@ -39,6 +49,15 @@ class SLCMetadata:
 
         self.iw2_mid_range = self.calculate_iw2_mid_range()
 
+    @staticmethod
+    def index_by_swath_and_polarization(paths):
+        # file names look like s1a-iw1-slc-vv-..., so each path is keyed by (polarization, swath number)
+        index = {}
+        for path in paths:
+            swath_number, polarization = SWATH_POL_PATTERN.search(path).groups()
+            index[(polarization, int(swath_number))] = path
+        return index
+
     def calculate_iw2_mid_range(self):
         iw2_annotation = [self.annotations[k] for k in self.annotations if 'iw2' in k][0]
         iw2_slant_range_time = float(iw2_annotation.findtext('.//{*}slantRangeTime'))
@@ -61,12 +80,19 @@ class SwathMetadata:
                  'platform', 'slc_start_anx']
         [setattr(self, x, getattr(slc, x)) for x in attrs]
 
-        pattern = f'^.*/s1.-iw{self.swath_index + 1}-slc-{self.polarization.lower()}.*$'
-        self.annotation_path = [x for x in slc.annotations if re.search(pattern, x)][0]
-        self.measurement_path = [x for x in slc.measurement_paths if re.search(pattern, x)][0]
+        swath_key = (self.polarization.lower(), self.swath_index + 1)
+        self.annotation_path = slc.annotation_index[swath_key]
+        self.measurement_path = slc.measurement_index[swath_key]
         self.annotation = slc.annotations[self.annotation_path]
+        self.data_offset = slc.data_offsets.get(f'{self.safe_name}/{self.measurement_path}')
 
         self.n_bursts = int(self.annotation.find('.//{*}burstList').attrib['count'])
+        self.burst_annotations = self.annotation.findall('.//{*}burst')
+        byte_offset0 = int(self.burst_annotations[0].findtext('.//{*}byteOffset'))
+        byte_offset1 = int(self.burst_annotations[1].findtext('.//{*}byteOffset'))
+        self.byte_length = byte_offset1 - byte_offset0
+        self.lines = int(self.annotation.findtext('.//{*}linesPerBurst'))
+        self.samples = int(self.annotation.findtext('.//{*}samplesPerBurst'))
         self.radar_center_frequency = float(self.annotation.findtext('.//{*}radarFrequency'))
         self.wavelength = utils.SPEED_OF_LIGHT / self.radar_center_frequency
         self.azimuth_steer_rate = np.radians(float(self.annotation.findtext('.//{*}azimuthSteeringRate')))
@@ -82,9 +108,12 @@ class SwathMetadata:
         self.prf_raw_data = float(self.annotation.findtext('.//{*}prf'))
         self.range_chirp_rate = float(self.annotation.findtext('.//{*}txPulseRampRate'))
 
-        self.azimuth_frame_rates = self.get_polynomials('.//{*}azimuthFmRateList', 'azimuthFmRatePolynomial')
-        self.dopplers = self.get_polynomials('.//{*}dcEstimateList', 'dataDcPolynomial')
+        self.azimuth_frame_rate_times, self.azimuth_frame_rates = self.get_polynomials(
+            './/{*}azimuthFmRateList', 'azimuthFmRatePolynomial'
+        )
+        self.doppler_times, self.dopplers = self.get_polynomials('.//{*}dcEstimateList', 'dataDcPolynomial')
         self.gcp_df = self.create_gcp_df()
+        self.gcp_by_line = {line: x[['longitude', 'latitude']].to_numpy() for line, x in self.gcp_df.groupby('line')}
 
     @staticmethod
     def reformat_gcp(point):
@@ -101,10 +130,12 @@ class SwathMetadata:
         return gcp_df
 
     def get_polynomials(self, xml_pattern, poly_name):
-        doppler_list_element = self.annotation.find(xml_pattern)
-        polynomial_list = [self.parse_polynomial_element(x, poly_name) for x in doppler_list_element]
-        polynomials = {k: v for k, v in polynomial_list}
-        return polynomials
+        poly_list_element = self.annotation.find(xml_pattern)
+        polynomial_list = [self.parse_polynomial_element(x, poly_name) for x in poly_list_element]
+        polynomial_list.sort(key=lambda x: x[0])
+        times = np.array([x[0] for x in polynomial_list], dtype='datetime64[us]')
+        polynomials = [x[1] for x in polynomial_list]
+        return times, polynomials
 
     @staticmethod
     def parse_polynomial_element(poly_element, poly_name):
@@ -112,7 +143,7 @@ class SwathMetadata:
 
         half_c = 0.5 * utils.SPEED_OF_LIGHT
         r0 = half_c * float(poly_element.findtext('t0'))
-        coeffs = [float(x) for x in poly_element.findtext(poly_name).split()]
+        coeffs = np.fromstring(poly_element.findtext(poly_name), sep=' ').tolist()
         poly1d_inputs = [coeffs, r0, half_c]  # inputs to isce3.core.Poly1d class
         return ref_time, poly1d_inputs
 
@@ -120,67 +151,41 @@ class SwathMetadata:
 class BurstMetadata:
     def __init__(self, swath, burst_index):
         self.burst_index = burst_index
-        attrs = ['absolute_orbit', 'annotation_path', 'azimuth_steer_rate', 'azimuth_time_interval', 'iw2_mid_range',
-                 'measurement_path',
+        attrs = ['absolute_orbit', 'annotation_path', 'azimuth_steer_rate', 'azimuth_time_interval', 'byte_length',
+                 'data_offset', 'iw2_mid_range', 'lines', 'measurement_path',
                  'orbit_direction', 'platform', 'polarization', 'prf_raw_data', 'radar_center_frequency',
                  'range_bandwidth', 'range_chirp_rate', 'range_pixel_spacing', 'range_sampling_rate',
                  'range_window_coefficient', 'range_window_type', 'rank', 'relative_orbit', 'safe_name', 'safe_url',
-                 'slant_range_time', 'slc_start_anx', 'starting_range', 'swath_index', 'wavelength']
+                 'samples', 'slant_range_time', 'slc_start_anx', 'starting_range', 'swath_index', 'wavelength']
         [setattr(self, x, getattr(swath, x)) for x in attrs]
 
-        burst_annotations = swath.annotation.findall('.//{*}burst')
-        byte_offset0 = int(burst_annotations[0].findtext('.//{*}byteOffset'))
-        byte_offset1 = int(burst_annotations[1].findtext('.//{*}byteOffset'))
-        self.burst_annotation = burst_annotations[burst_index]
-        self.byte_offset = int(self.burst_annotation.findtext('.//{*}byteOffset'))
-        self.byte_length = byte_offset1 - byte_offset0
-
-        self.lines = int(swath.annotation.findtext('.//{*}linesPerBurst'))
-        self.samples = int(swath.annotation.findtext('.//{*}samplesPerBurst'))
-        self.sensing_start = self.burst_annotation.findtext('.//{*}azimuthTime')
-        self.sensing_stop = self.burst_annotation.findtext('.//{*}azimuthTime')
-        self.burst_anx_delta = float(self.burst_annotation.find('.//{*}azimuthAnxTime').text)
+        # the xml element is only used during init so bursts don't keep the annotation trees alive
+        burst_annotation = swath.burst_annotations[burst_index]
+        self.byte_offset = int(burst_annotation.findtext('.//{*}byteOffset'))
+        self.sensing_start = burst_annotation.findtext('.//{*}azimuthTime')
+        self.sensing_start_dt = utils.convert_dt(self.sensing_start)
+        self.sensing_stop = burst_annotation.findtext('.//{*}azimuthTime')
+        self.burst_anx_delta = float(burst_annotation.find('.//{*}azimuthAnxTime').text)
         self.burst_anx = self.slc_start_anx + self.burst_anx_delta
 
-        self.azimuth_frame_rate = self.get_nearest_polynomial(swath.azimuth_frame_rates)
-        self.doppler = self.get_nearest_polynomial(swath.dopplers)
-        self.first_valid_sample, self.last_valid_sample, self.first_valid_line, self.last_valid_line = self.get_lines_and_samples()
+        self.azimuth_frame_rate = self.get_nearest_polynomial(swath.azimuth_frame_rate_times, swath.azimuth_frame_rates)
+        self.doppler = self.get_nearest_polynomial(swath.doppler_times, swath.dopplers)
+        self.first_valid_sample, self.last_valid_sample, self.first_valid_line, self.last_valid_line = \
+            self.get_lines_and_samples(burst_annotation)
 
         self.relative_burst_id = self.calculate_relative_burstid()
         self.stack_id = f'{self.relative_burst_id}_IW{self.swath_index + 1}'
         self.opera_id = f't{self.relative_orbit}_{self.stack_id.lower()}'
-        self.footprint, self.bounds, self.center = self.create_geometry(swath.gcp_df)
-        reformatted_datetime = utils.convert_dt(self.sensing_start).strftime('%Y%m%dT%H%M%S')
+        self.footprint, self.bounds, self.center = self.create_geometry(swath.gcp_by_line)
+        reformatted_datetime = self.sensing_start_dt.strftime('%Y%m%dT%H%M%S')
         self.absolute_burst_id = f'S1_SLC_{reformatted_datetime}_{self.relative_burst_id}_IW{self.swath_index + 1}'
 
-    def get_nearest_polynomial(self, time_poly_pair):
+    def get_nearest_polynomial(self, poly_times, polynomials):
         d_seconds = 0.5 * (self.lines - 1) * self.azimuth_time_interval
-        t_mid = utils.convert_dt(self.sensing_start) + timedelta(seconds=d_seconds)
-
-        t_all = sorted([utils.convert_dt(x) for x in time_poly_pair.keys()])
-
-        # calculate 1st dt and polynomial
-        t_start = t_all[0]
-        dt = self.get_abs_dt(t_mid, t_start)
-        nearest_poly = time_poly_pair[utils.convert_dt(t_start)]
-
-        # loop thru remaining time, polynomial pairs
-        for t_iter in t_all[1:]:
-            temp_dt = self.get_abs_dt(t_mid, t_iter)
+        t_mid = self.sensing_start_dt + timedelta(seconds=d_seconds)
 
-            # stop looping if dt starts growing
-            if temp_dt > dt:
-                break
-
-            # set dt and polynomial for next iteration
-            dt, nearest_poly = temp_dt, time_poly_pair[utils.convert_dt(t_iter)]
-
-        return nearest_poly
-
-    @staticmethod
-    def get_abs_dt(t_mid, t_new):
-        abs_dt = np.abs((t_mid - t_new).total_seconds())
-        return abs_dt
+        nearest_index = np.argmin(np.abs(poly_times - np.datetime64(t_mid)))
+        return polynomials[nearest_index]
 
     def calculate_relative_burstid(self):
         orbital = (self.relative_orbit - 1) * utils.NOMINAL_ORBITAL_DURATION
@@ -190,42 +195,38 @@ class BurstMetadata:
         relative_burstid += 1
         return int(relative_burstid)
 
-    def create_geometry(self, gcp_df):
-        first_line = gcp_df.loc[gcp_df['line'] == self.burst_index * self.lines, ['longitude', 'latitude']]
-        second_line = gcp_df.loc[gcp_df['line'] == (self.burst_index + 1) * self.lines, ['longitude', 'latitude']]
-        x1 = first_line['longitude'].tolist()
-        y1 = first_line['latitude'].tolist()
-        x2 = second_line['longitude'].tolist()
-        y2 = second_line['latitude'].tolist()
-        x2.reverse()
-        y2.reverse()
-        x = x1 + x2
-        y = y1 + y2
-        footprint = geometry.Polygon(zip(x, y))
+    def create_geometry(self, gcp_by_line):
+        first_line = gcp_by_line[self.burst_index * self.lines]
+        second_line = gcp_by_line[(self.burst_index + 1) * self.lines]
+        coords = np.concatenate([first_line, second_line[::-1]])
+
+        footprint = geometry.Polygon(coords)
+        bounds = (*coords.min(axis=0).tolist(), *coords.max(axis=0).tolist())
         centroid = tuple([x[0] for x in footprint.centroid.xy])
-        return footprint, footprint.bounds, centroid
+        return footprint, bounds, centroid
 
-    def get_lines_and_samples(self):
-        first_valid_samples = [int(x) for x in self.burst_annotation.findtext('firstValidSample').split()]
-        last_valid_samples = [int(x) for x in self.burst_annotation.findtext('lastValidSample').split()]
+    @staticmethod
+    def get_lines_and_samples(burst_annotation):
+        first_valid_samples = np.fromstring(burst_annotation.findtext('firstValidSample'), dtype=np.int32, sep=' ')
+        last_valid_samples = np.fromstring(burst_annotation.findtext('lastValidSample'), dtype=np.int32, sep=' ')
 
-        first_valid_line = [x >= 0 for x in first_valid_samples].index(True)
-        n_valid_lines = [x >= 0 for x in first_valid_samples].count(True)
-        last_valid_line = first_valid_line + n_valid_lines - 1
+        valid_lines = first_valid_samples >= 0
+        first_valid_line = int(np.argmax(valid_lines))
+        last_valid_line = first_valid_line + int(valid_lines.sum()) - 1
 
-        first_valid_sample = max(first_valid_samples[first_valid_line],
-                                 first_valid_samples[last_valid_line])
-        last_valid_sample = min(last_valid_samples[first_valid_line],
-                                last_valid_samples[last_valid_line])
+        first_valid_sample = int(max(first_valid_samples[first_valid_line],
+                                     first_valid_samples[last_valid_line]))
+        last_valid_sample = int(min(last_valid_samples[first_valid_line],
+                                    last_valid_samples[last_valid_line]))
 
         return first_valid_sample, last_valid_sample, first_valid_line, last_valid_line,
 
     def to_series(self):
-        attribs = ['absolute_burst_id', 'relative_burst_id', 'datetime', 'footprint']
+        attribs = ['absolute_burst_id', 'relative_burst_id', 'sensing_start_dt', 'footprint']
         attrib_dict = {k: getattr(self, k) for k in attribs}
         return pd.Series(attrib_dict)
 
-    def to_stac_item(self):
+    def to_stac_dict(self):
         properties = {'stack_id': self.stack_id}
         for_opera = ['wavelength', 'azimuth_steer_rate', 'azimuth_time_interval', 'slant_range_time', 'starting_range',
                      'iw2_mid_range', 'range_sampling_rate', 'range_pixel_spacing', 'azimuth_frame_rate', 'doppler',
@@ -234,29 +235,40 @@ class BurstMetadata:
                      'prf_raw_data', 'range_chirp_rate']
         properties = properties | {k: getattr(self, k) for k in for_opera}
 
-        asset_properties = {'lines': self.lines, 'samples': self.samples, 'byte_offset': self.byte_offset,
-                            'byte_length': self.byte_length,
-                            'interior_path': f'{self.safe_name}/{self.measurement_path}'}
-
-        item = pystac.Item(id=self.absolute_burst_id,
-                           geometry=geometry.mapping(self.footprint),
-                           bbox=self.bounds,
-                           datetime=utils.convert_dt(self.sensing_start),
-                           properties=properties)
-
-        ext_sat = sat.SatExtension.ext(item, add_if_missing=True)
-        ext_sat.apply(sat.OrbitState(self.orbit_direction), self.relative_orbit, self.absolute_orbit,
-                      utils.INTERNATIONAL_IDS[self.platform],
-                      utils.convert_dt(self.sensing_start))
-
-        ext_sar = sar.SarExtension.ext(item, add_if_missing=True)
-        ext_sar.apply('IW', sar.FrequencyBand('C'), [sar.Polarization(self.polarization.upper())], 'SLC-BURST',
-                      self.radar_center_frequency, looks_range=1, looks_azimuth=1,
-                      observation_direction=sar.ObservationDirection('right'))
-
-        item.add_asset(key=self.polarization.upper(),
-                       asset=pystac.Asset(href=self.safe_url, media_type=pystac.MediaType.GEOTIFF,
-                                          extra_fields=asset_properties))
+        # same fields the pystac sat/sar extensions would set, written directly to skip per-item pystac overhead
+        sensing_start = pystac.utils.datetime_to_str(self.sensing_start_dt)
+        properties['datetime'] = sensing_start
+        properties['sat:orbit_state'] = self.orbit_direction
+        properties['sat:relative_orbit'] = self.relative_orbit
+        properties['sat:absolute_orbit'] = self.absolute_orbit
+        properties['sat:platform_international_designator'] = utils.INTERNATIONAL_IDS[self.platform]
+        properties['sat:anx_datetime'] = sensing_start
+        properties['sar:instrument_mode'] = 'IW'
+        properties['sar:frequency_band'] = 'C'
+        properties['sar:polarizations'] = [self.polarization.upper()]
+        properties['sar:product_type'] = 'SLC-BURST'
+        properties['sar:center_frequency'] = self.radar_center_frequency
+        properties['sar:looks_range'] = 1
+        properties['sar:looks_azimuth'] = 1
+        properties['sar:observation_direction'] = 'right'
+
+        asset = {'href': self.safe_url, 'type': pystac.MediaType.GEOTIFF, 'lines': self.lines, 'samples': self.samples,
+                 'byte_offset': self.byte_offset, 'byte_length': self.byte_length, 'data_offset': self.data_offset,
+                 'interior_path': f'{self.safe_name}/{self.measurement_path}'}
+
+        item_dict = {'type': 'Feature',
+                     'stac_version': pystac.get_stac_version(),
+                     'stac_extensions': [sat.SCHEMA_URI, sar.SCHEMA_URI],
+                     'id': self.absolute_burst_id,
+                     'geometry': geometry.mapping(self.footprint),
+                     'bbox': list(self.bounds),
+                     'properties': properties,
+                     'links': [],
+                     'assets': {self.polarization.upper(): asset}}
+        return item_dict
+
+    def to_stac_item(self):
+        item = pystac.Item.from_dict(self.to_stac_dict(), preserve_dict=False)
         return item
 
 
@@ -267,105 +279,123 @@ def download_safe_xml(zip_fs, safe_url, interior_path):
 
 
 def local_read_metadata(zip_path):
-    safe_name = Path(zip_path).with_suffix('.SAFE').name
-    manifest_name = f'{safe_name}/manifest.safe'
+    # zipfile.ZipFile.open streams members, so nothing is extracted to disk
     with zipfile.ZipFile(zip_path) as z:
-        manifest = ET.parse(z.extract(manifest_name)).getroot()
+        manifest = download_safe_xml(z, str(zip_path), 'manifest.safe')
 
         file_paths = [x.attrib['href'] for x in manifest.findall('.//fileLocation')]
 
-        annotation_paths = [x[2:] for x in file_paths if re.search('^\./annotation/s1.*xml$', x)]
+        annotation_paths = [x[2:] for x in file_paths if ANNOTATION_PATTERN.search(x)]
         annotation_paths.sort()
-        annotations = {x: ET.parse(z.extract(f'{safe_name}/{x}')).getroot() for x in annotation_paths}
-    return manifest, annotations
+        annotations = {x: download_safe_xml(z, str(zip_path), x) for x in annotation_paths}
+        data_offsets = utils.get_zip_data_offsets(z)
+    return manifest, annotations, data_offsets
 
 
 def edl_download_metadata(safe_url, auth):
-    storage_options = {'https': {'client_kwargs': {'trust_env': True, 'auth': auth}}}
-
-    http_fs = fsspec.filesystem('https', **storage_options['https'])
+    http_fs = utils.get_https_filesystem(auth)
     with http_fs.open(safe_url) as fo:
         safe_zip = fsspec.filesystem('zip', fo=fo)
         manifest = download_safe_xml(safe_zip, safe_url, 'manifest.safe')
 
         file_paths = [x.attrib['href'] for x in manifest.findall('.//fileLocation')]
-        annotation_paths = [x[2:] for x in file_paths if re.search('^\./annotation/s1.*xml$', x)]
+        annotation_paths = [x[2:] for x in file_paths if ANNOTATION_PATTERN.search(x)]
         annotation_paths.sort()
 
         annotations = {x: download_safe_xml(safe_zip, safe_url, x) for x in annotation_paths}
+        data_offsets = utils.fetch_zip_data_offsets(http_fs, safe_url, utils.get_stored_members(safe_zip.zip))
+
+    return manifest, annotations, data_offsets
+
 
-    return manifest, annotations
+def get_safe_burst_metadata(safe_url, auth):
+    manifest, annotations, data_offsets = edl_download_metadata(safe_url, auth)
+    slc = SLCMetadata(safe_url, manifest, annotations, data_offsets)
+
+    bursts = []
+    polarization_swath = product(slc.polarizations, range(slc.n_swaths))
+    for polarization, swath_index in polarization_swath:
+        swath = SwathMetadata(slc, polarization, swath_index)
+        bursts += [BurstMetadata(swath, burst_index) for burst_index in range(swath.n_bursts)]
+
+    return bursts
 
 
 def get_burst_metadata(safe_url_list, threads=None):
     auth = utils.get_netrc_auth()
 
+    # parse each SAFE in the same worker that downloads it so parsing overlaps with the other downloads
     if threads:
         args = [(safe_url, auth) for safe_url in safe_url_list]
-        result = pqdm(args, edl_download_metadata, n_jobs=threads, argument_type="args")
-        safe_metadata = {key: value for key, value in zip(safe_url_list, result)}
+        safe_bursts = pqdm(args, get_safe_burst_metadata, n_jobs=threads, argument_type="args")
     else:
-        safe_metadata = {x: edl_download_metadata(x, auth) for x in safe_url_list}
-
-    bursts = []
-    for safe_url in safe_url_list:
-        manifest, annotations = safe_metadata[safe_url]
-        slc = SLCMetadata(safe_url, manifest, annotations)
-        polarization_swath = product(slc.polarizations, range(slc.n_swaths))
-        for polarization, swath_index in polarization_swath:
-            swath = SwathMetadata(slc, polarization, swath_index)
-            for burst_index in range(swath.n_bursts):
-                burst = BurstMetadata(swath, burst_index)
-                bursts.append(burst)
+        safe_bursts = [get_safe_burst_metadata(x, auth) for x in safe_url_list]
 
+    bursts = [burst for burst_list in safe_bursts for burst in burst_list]
     return bursts
 
 
+def generate_burst_geodataframe(burst_list):
+    attribs = ['absolute_burst_id', 'relative_burst_id', 'stack_id', 'opera_id', 'polarization', 'orbit_direction',
+               'relative_orbit', 'absolute_orbit', 'sensing_start_dt', 'safe_url']
+    columns = {k: [getattr(x, k) for x in burst_list] for k in attribs}
+
+    burst_gdf = gpd.GeoDataFrame(columns, geometry=[x.footprint for x in burst_list], crs='EPSG:4326')
+    return burst_gdf
+
+
 def generate_burst_stac_catalog(burst_list):
     catalog = pystac.Catalog(id='burst-catalog', description='A catalog containing Sentinel-1 burst SLCs',
                              catalog_type=pystac.CatalogType.SELF_CONTAINED)
-    burst_items = [x.to_stac_item() for x in burst_list]
-    stack_ids = set([x.properties['stack_id'] for x in burst_items])
 
-    for stack_id in stack_ids:
-        stack_items = [x for x in burst_items if x.properties['stack_id'] == stack_id]
+    # group by stack and merge the polarizations of each burst into one item in a single pass
+    stacks = defaultdict(dict)
+    for burst in burst_list:
+        item_dict = burst.to_stac_dict()
+        stack = stacks[item_dict['properties']['stack_id']]
+        if item_dict['id'] not in stack:
+            stack[item_dict['id']] = item_dict
+        else:
+            stack[item_dict['id']]['assets'] |= item_dict['assets']
+            stack[item_dict['id']]['properties']['sar:polarizations'] += item_dict['properties']['sar:polarizations']
+
+    for stack_id, stack_dicts in stacks.items():
+        stack_items = [pystac.Item.from_dict(x, preserve_dict=False) for x in stack_dicts.values()]
         orbit_direction = stack_items[0].properties['sat:orbit_state']
-        footprints = [geometry.Polygon(x.geometry['coordinates'][0]) for x in stack_items]
+        bboxes = np.array([x.bbox for x in stack_items])
+        stack_bounds = [*bboxes[:, :2].min(axis=0).tolist(), *bboxes[:, 2:].max(axis=0).tolist()]
         datetimes = [x.datetime for x in stack_items]
-        # footprint = unary_union(footprints)
-        footprint = footprints[0]
         date_min, date_max = min(datetimes), max(datetimes)
 
-        spatial_extent = pystac.SpatialExtent(list(footprint.bounds))
+        spatial_extent = pystac.SpatialExtent(stack_bounds)
         temporal_extent = pystac.TemporalExtent(intervals=[[date_min, date_max]])
         collection_extent = pystac.Extent(spatial=spatial_extent, temporal=temporal_extent)
         collection = pystac.Collection(id=stack_id,
                                        description=f'Sentinel-1 Burst Stack {stack_id}',
                                        extent=collection_extent,
                                        extra_fields={'sat:orbit_state': orbit_direction})
-        for item in stack_items:
-            item_from_catalog = collection.get_item(item.id)
-            if not item_from_catalog:
-                collection.add_items(stack_items)
-            else:
-                collection.remove_item(item_from_catalog.id)
-                item_polarization = item.properties['sar:polarizations'][0]
-                item_from_catalog.add_asset(key=item_polarization, asset=item.assets[item_polarization])
-                item_from_catalog.properties['sar:polarizations'] += [item_polarization]
-                collection.add_item(item_from_catalog)
+        collection.add_items(stack_items)
 
         catalog.add_child(collection)
 
     return catalog
 
 
+class OrjsonStacIO(pystac.stac_io.DefaultStacIO):
+    def json_loads(self, txt, *args, **kwargs):
+        return orjson.loads(txt)
+
+    def json_dumps(self, json_dict, *args, **kwargs):
+        return orjson.dumps(json_dict, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
 def save_stac_catalog_locally(catalog, catalog_name):
     stac_location = Path('.') / catalog_name
     if not stac_location.exists():
         stac_location.mkdir()
     catalog.normalize_hrefs(str(stac_location))
     catalog.make_all_asset_hrefs_relative()
-    catalog.save(catalog_type=pystac.CatalogType.SELF_CONTAINED)
+    catalog.save(catalog_type=pystac.CatalogType.SELF_CONTAINED, stac_io=OrjsonStacIO())
     return stac_location / 'catalog.json'
 
 
@@ -383,5 +413,5 @@ def initiate_stac_catalog_server(port, catalog_dir):
     url = f'http://localhost:{port}/catalog.json'
     print(f'{url}\n', 'In stac-browser run:\n', f'npm start -- --open --CATALOG_URL="{url}" ')
 
-    with HTTPServer(('localhost', port), CORSRequestHandler) as httpd:
+    with ThreadingHTTPServer(('localhost', port), CORSRequestHandler) as httpd:
         httpd.serve_forever()
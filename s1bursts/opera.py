@@ -1,33 +1,76 @@
-import json
 import os
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import lru_cache
 
-import fsspec
 import isce3
 import numpy as np
+import orjson
 import requests
 import s1reader
 from osgeo import gdal
+from requests.adapters import HTTPAdapter
 from shapely import geometry
+from urllib3.util.retry import Retry
 
 from s1bursts import utils
 
+# compass is only needed for georeferencing, so the rest of the module works without it
+try:
+    from compass.utils.geo_grid import generate_geogrids
+except ImportError:
+    generate_geogrids = None
+
+# shared by the CMR and orbit requests so connections to each host are kept alive between bursts
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                           max_retries=Retry(total=3, backoff_factor=0.3)))
+
+# largest page_size CMR accepts for a single search request
+CMR_MAX_PAGE_SIZE = 2000
+CMR_FLOAT_ATTRIBUTES = (
+    'AZIMUTH_STEER_RATE', 'AZIMUTH_TIME_INTERVAL', 'CENTER_LAT', 'CENTER_LON', 'IW2_MID_RANGE', 'PRF_RAW_DATA',
+    'RADAR_CENTER_FREQUENCY', 'RANGE_BANDWIDTH', 'RANGE_CHIRP_RATE', 'RANGE_PIXEL_SPACING', 'RANGE_SAMPLING_RATE',
+    'RANGE_WINDOW_COEFFICIENT', 'SLANT_RANGE_TIME', 'STARTING_RANGE', 'WAVELENGTH',
+)
+CMR_INT_ATTRIBUTES = (
+    'BURST_INDEX', 'BYTE_LENGTH', 'BYTE_OFFSET', 'FIRST_VALID_LINE', 'FIRST_VALID_SAMPLE', 'LAST_VALID_LINE',
+    'LAST_VALID_SAMPLE', 'LINES', 'RANK', 'SAMPLES',
+)
+
+
+# bursts from the same SLC share an orbit file, so each one is located and parsed only once per process
+@lru_cache(maxsize=32)
+def read_osv_list(orbit_path):
+    with open(orbit_path, 'r') as f:
+        orbit_xml = ET.parse(f)
+    return orbit_xml.find('Data_Block/List_of_OSVs')
 
-def stac_item_to_opera_burst(item, polarization, orbit_dir, remote=False):
-    import isce3
-    import s1reader
-    from s1reader import Sentinel1BurstSlc
 
+@lru_cache(maxsize=32)
+def find_orbit_url(safe_name):
+    sensor_id, _, start_time, end_time, _ = s1reader.s1_orbit.parse_safe_filename(safe_name)
+    orbit_dict = s1reader.s1_orbit.get_orbit_dict(sensor_id, start_time, end_time, 'AUX_POEORB')
+    if orbit_dict is None:
+        orbit_dict = s1reader.s1_orbit.get_orbit_dict(sensor_id, start_time, end_time, 'AUX_RESORB')
+    return orbit_dict['orbit_url']
+
+
+@lru_cache(maxsize=32)
+def download_osv_list(orbit_url):
+    response = HTTP_SESSION.get(url=orbit_url, auth=(utils.SCIHUB_USER, utils.SCIHUB_PASSWORD))
+    return ET.fromstring(response.content).find('Data_Block/List_of_OSVs')
+
+
+def stac_item_to_opera_burst(item, polarization, orbit_dir, remote=False):
     properties = item.properties
     asset = item.assets[polarization.upper()]
     asset_properties = asset.to_dict()
 
     # platform
-    platform = \
-        [k for k in utils.INTERNATIONAL_IDS if
-         utils.INTERNATIONAL_IDS[k] == properties['sat:platform_international_designator']][0]
+    # strip so catalogs written before the S1A designator lost its stray leading space still resolve
+    platform = utils.INTERNATIONAL_IDS_REVERSE[properties['sat:platform_international_designator'].strip()]
 
     # doppler
     shape = (asset_properties['lines'], asset_properties['samples'])
@@ -41,9 +84,7 @@ def stac_item_to_opera_burst(item, polarization, orbit_dir, remote=False):
 
     # orbit
     orbit_path = s1reader.get_orbit_file_from_dir(asset.href.split('/')[-1], orbit_dir)
-    with open(orbit_path, 'r') as f:
-        orbit_xml = ET.parse(f)
-    osv_list = orbit_xml.find('Data_Block/List_of_OSVs')
+    osv_list = read_osv_list(orbit_path)
     sensing_duration = timedelta(seconds=shape[0] * properties['azimuth_time_interval'])
     orbit = s1reader.s1_reader.get_burst_orbit(item.datetime, item.datetime + sensing_duration, osv_list)
 
@@ -88,6 +129,7 @@ def stac_item_to_opera_burst(item, polarization, orbit_dir, remote=False):
         byte_length=asset_properties['byte_length'],
         interior_path=asset_properties['interior_path'],
         url_path=asset.href,
+        data_offset=asset_properties.get('data_offset'),
     )
 
     if remote:
@@ -95,59 +137,77 @@ def stac_item_to_opera_burst(item, polarization, orbit_dir, remote=False):
         all_args['tiff_path'] = ''
         opera_burst = RemoteSentinel1BurstSLC(**all_args)
     else:
-        opera_burst = Sentinel1BurstSlc(**args)
+        opera_burst = s1reader.Sentinel1BurstSlc(**args)
     return opera_burst
 
 
 def cmr_to_opera_burst(cmr_url, remote=False):
-    burst_response = json.loads(requests.get(cmr_url).content)['items'][0]
-    properties = attribute_dict = {x['Name']: x['Values'][0] for x in burst_response['umm']['AdditionalAttributes']}
-    sensing_start = datetime.fromisoformat(
-        burst_response['umm']['TemporalExtent']['RangeDateTime']['BeginningDateTime']).replace(tzinfo=None)
-    shape = (int(properties['LINES']), int(properties['SAMPLES']))
-    center = geometry.Point(float(properties['CENTER_LON']), float(properties['CENTER_LAT']))
+    burst_response = orjson.loads(HTTP_SESSION.get(cmr_url).content)['items'][0]
+    return umm_to_opera_burst(burst_response['umm'], remote)
+
+
+def cmr_to_opera_bursts(catalog_url, granule_urs, remote=False):
+    # one CMR search per CMR_MAX_PAGE_SIZE bursts instead of one round trip per burst. The URs go in a
+    # form-encoded POST body, a full page of them as GET query parameters is far past typical URL length limits
+    granule_urs = list(granule_urs)
+    bursts_by_ur = {}
+    for i in range(0, len(granule_urs), CMR_MAX_PAGE_SIZE):
+        chunk = granule_urs[i:i + CMR_MAX_PAGE_SIZE]
+        response = HTTP_SESSION.post(catalog_url, data={'granule_ur[]': chunk, 'page_size': len(chunk)})
+        response.raise_for_status()
+        bursts_by_ur |= {x['umm']['GranuleUR']: x['umm'] for x in orjson.loads(response.content)['items']}
+
+    missing = [x for x in granule_urs if x not in bursts_by_ur]
+    if missing:
+        raise ValueError(f'CMR returned no bursts for granule URs: {", ".join(missing)}')
+
+    opera_bursts = [umm_to_opera_burst(bursts_by_ur[x], remote) for x in granule_urs]
+    return opera_bursts
+
+
+def umm_to_opera_burst(burst_umm, remote=False):
+    # CMR stores every attribute as a string, so convert the numeric ones in one pass up front
+    properties = {x['Name']: x['Values'][0] for x in burst_umm['AdditionalAttributes']}
+    properties.update({k: float(properties[k]) for k in CMR_FLOAT_ATTRIBUTES})
+    properties.update({k: int(properties[k]) for k in CMR_INT_ATTRIBUTES})
+    begin_dt = burst_umm['TemporalExtent']['RangeDateTime']['BeginningDateTime']
+    sensing_start = utils.parse_dt(begin_dt).replace(tzinfo=None)
+    shape = (properties['LINES'], properties['SAMPLES'])
+    center = geometry.Point(properties['CENTER_LON'], properties['CENTER_LAT'])
 
     # boundary
-    point_dict = \
-        burst_response['umm']['SpatialExtent']['HorizontalSpatialDomain']['Geometry']['GPolygons'][0]['Boundary'][
-            'Points']
+    point_dict = burst_umm['SpatialExtent']['HorizontalSpatialDomain']['Geometry']['GPolygons'][0]['Boundary']['Points']
     border = [[x['Longitude'], x['Latitude']] for x in point_dict]
 
     # doppler
-    doppler_poly1d = isce3.core.Poly1d(*json.loads(properties['DOPPLER']))
+    doppler_poly1d = isce3.core.Poly1d(*orjson.loads(properties['DOPPLER']))
     doppler_lut2d = s1reader.s1_reader.doppler_poly1d_to_lut2d(doppler_poly1d,
-                                                               float(properties['STARTING_RANGE']),
-                                                               float(properties['RANGE_PIXEL_SPACING']),
+                                                               properties['STARTING_RANGE'],
+                                                               properties['RANGE_PIXEL_SPACING'],
                                                                shape,
-                                                               float(properties['AZIMUTH_TIME_INTERVAL']))
+                                                               properties['AZIMUTH_TIME_INTERVAL'])
     doppler = s1reader.s1_burst_slc.Doppler(doppler_poly1d, doppler_lut2d)
 
     # orbit
-    sensor_id, _, start_time, end_time, _ = s1reader.s1_orbit.parse_safe_filename(properties['SAFE_NAME'])
-    orbit_dict = s1reader.s1_orbit.get_orbit_dict(sensor_id, start_time, end_time, 'AUX_POEORB')
-    if orbit_dict is None:
-        orbit_dict = s1reader.s1_orbit.get_orbit_dict(sensor_id, start_time, end_time, 'AUX_RESORB')
-
-    response = requests.get(url=orbit_dict['orbit_url'], auth=(utils.SCIHUB_USER, utils.SCIHUB_PASSWORD))
-    osv_list = ET.fromstring(response.content).find('Data_Block/List_of_OSVs')
-    sensing_duration = timedelta(seconds=shape[0] * float(properties['AZIMUTH_TIME_INTERVAL']))
+    osv_list = download_osv_list(find_orbit_url(properties['SAFE_NAME']))
+    sensing_duration = timedelta(seconds=shape[0] * properties['AZIMUTH_TIME_INTERVAL'])
     orbit = s1reader.s1_reader.get_burst_orbit(sensing_start, sensing_start + sensing_duration, osv_list)
 
     args = dict(
         sensing_start=sensing_start,
-        radar_center_frequency=float(properties['RADAR_CENTER_FREQUENCY']),
-        wavelength=float(properties['WAVELENGTH']),
-        azimuth_steer_rate=float(properties['AZIMUTH_STEER_RATE']),
-        azimuth_time_interval=float(properties['AZIMUTH_TIME_INTERVAL']),
-        slant_range_time=float(properties['SLANT_RANGE_TIME']),
-        starting_range=float(properties['STARTING_RANGE']),
-        iw2_mid_range=float(properties['IW2_MID_RANGE']),
-        range_sampling_rate=float(properties['RANGE_SAMPLING_RATE']),
-        range_pixel_spacing=float(properties['RANGE_PIXEL_SPACING']),
+        radar_center_frequency=properties['RADAR_CENTER_FREQUENCY'],
+        wavelength=properties['WAVELENGTH'],
+        azimuth_steer_rate=properties['AZIMUTH_STEER_RATE'],
+        azimuth_time_interval=properties['AZIMUTH_TIME_INTERVAL'],
+        slant_range_time=properties['SLANT_RANGE_TIME'],
+        starting_range=properties['STARTING_RANGE'],
+        iw2_mid_range=properties['IW2_MID_RANGE'],
+        range_sampling_rate=properties['RANGE_SAMPLING_RATE'],
+        range_pixel_spacing=properties['RANGE_PIXEL_SPACING'],
         shape=shape,
-        azimuth_fm_rate=isce3.core.Poly1d(*json.loads(properties['AZIMUTH_FRAME_RATE'])),
+        azimuth_fm_rate=isce3.core.Poly1d(*orjson.loads(properties['AZIMUTH_FRAME_RATE'])),
         doppler=doppler,
-        range_bandwidth=float(properties['RANGE_BANDWIDTH']),
+        range_bandwidth=properties['RANGE_BANDWIDTH'],
         polarization=properties['POLARIZATION'],
         burst_id=properties['OPERA_ID'],
         platform_id=properties['SAFE_NAME'][:3],
@@ -156,24 +216,28 @@ def cmr_to_opera_burst(cmr_url, remote=False):
         orbit=orbit,
         orbit_direction=properties['ASCENDING_DESCENDING'],
         tiff_path='',
-        i_burst=int(properties['BURST_INDEX']),
-        first_valid_sample=int(properties['FIRST_VALID_SAMPLE']),
-        last_valid_sample=int(properties['LAST_VALID_SAMPLE']),
-        first_valid_line=int(properties['FIRST_VALID_LINE']),
-        last_valid_line=int(properties['LAST_VALID_LINE']),
+        i_burst=properties['BURST_INDEX'],
+        first_valid_sample=properties['FIRST_VALID_SAMPLE'],
+        last_valid_sample=properties['LAST_VALID_SAMPLE'],
+        first_valid_line=properties['FIRST_VALID_LINE'],
+        last_valid_line=properties['LAST_VALID_LINE'],
         range_window_type=properties['RANGE_WINDOW_TYPE'].capitalize(),
-        range_window_coefficient=float(properties['RANGE_WINDOW_COEFFICIENT']),
-        rank=int(properties['RANK']),
-        prf_raw_data=float(properties['PRF_RAW_DATA']),
-        range_chirp_rate=float(properties['RANGE_CHIRP_RATE']),
+        range_window_coefficient=properties['RANGE_WINDOW_COEFFICIENT'],
+        rank=properties['RANK'],
+        prf_raw_data=properties['PRF_RAW_DATA'],
+        range_chirp_rate=properties['RANGE_CHIRP_RATE'],
     )
 
+    # bursts without a recorded zip data offset have the string 'None' in CMR
+    data_offset = properties.get('DATA_OFFSET', 'None')
+    data_offset = int(data_offset) if data_offset != 'None' else None
     remote_args = dict(
         absolute_id=properties['GROUP_ID'],
-        byte_offset=int(properties['BYTE_OFFSET']),
-        byte_length=int(properties['BYTE_LENGTH']),
+        byte_offset=properties['BYTE_OFFSET'],
+        byte_length=properties['BYTE_LENGTH'],
         interior_path=f'{properties["SAFE_NAME"]}/{properties["MEASUREMENT_PATH"]}',
         url_path=properties['SAFE_URL'],
+        data_offset=data_offset,
     )
 
     if remote:
@@ -192,35 +256,83 @@ class RemoteSentinel1BurstSLC(s1reader.Sentinel1BurstSlc):
     byte_length: int
     interior_path: str
     url_path: str
+    data_offset: int = None
 
-    def edl_download_data(self):
+    def get_byte_range(self, auth):
+        data_offset = self.data_offset
+        if data_offset is None:
+            # central directory is read once per SAFE and cached, so later bursts skip the zip probing entirely
+            data_offset = utils.get_remote_data_offset(self.url_path, self.interior_path, auth)
+        if data_offset is None:
+            return None
+
+        start = data_offset + self.byte_offset
+        return start, start + self.byte_length
+
+    def edl_download_bytes(self):
         auth = utils.get_netrc_auth()
-        storage_options = {'https': {'client_kwargs': {'trust_env': True, 'auth': auth}}}
+        http_fs = utils.get_https_filesystem(auth)
+        byte_range = self.get_byte_range(auth)
 
-        http_fs = fsspec.filesystem('https', **storage_options['https'])
-        with http_fs.open(self.url_path) as http_f:
-            zip_fs = fsspec.filesystem('zip', fo=http_f)
-            with zip_fs.open(self.interior_path) as f:
-                f.seek(self.byte_offset)
-                burst_bytes = f.read(self.byte_length)
+        if byte_range is not None:
+            burst_bytes = http_fs.cat_file(self.url_path, start=byte_range[0], end=byte_range[1])
+        else:
+            burst_bytes = utils.read_zip_member_range(http_fs, self.url_path, self.interior_path, self.byte_offset,
+                                                      self.byte_length)
 
-        return utils.burst_bytes_to_numpy(burst_bytes, self.shape)
+        return burst_bytes
 
-    def slc_to_file(self, out_path, fmt='ENVI'):
+    def edl_download_data(self):
+        return utils.burst_bytes_to_numpy(self.edl_download_bytes(), self.shape)
+
+    def slc_to_file(self, out_path, fmt='ENVI', block_size=512):
         self.tiff_path = str(out_path)
-        array = self.edl_download_data()
+        burst_bytes = memoryview(self.edl_download_bytes())
         driver = gdal.GetDriverByName(fmt)
-        n_rows, n_cols = array.shape
-        out_dataset = driver.Create(self.tiff_path, n_cols, n_rows, 1, gdal.GDT_CFloat32)
-        out_dataset.GetRasterBand(1).WriteArray(array)
+        n_rows, n_cols = self.shape
+        options = ['TILED=YES', f'BLOCKXSIZE={block_size}', f'BLOCKYSIZE={block_size}'] if fmt == 'GTiff' else []
+        out_dataset = driver.Create(self.tiff_path, n_cols, n_rows, 1, gdal.GDT_CFloat32, options=options)
+
+        # decode and write one row of tiles at a time through a reused buffer, so only the int16 download and
+        # a single block of complex64 are held instead of the full decoded burst
+        band = out_dataset.GetRasterBand(1)
+        block = np.empty((min(block_size, n_rows), n_cols), dtype=np.csingle)
+        row_nbytes = n_cols * 4
+        for row in range(0, n_rows, block_size):
+            n_block_rows = min(block_size, n_rows - row)
+            block_bytes = burst_bytes[row * row_nbytes:(row + n_block_rows) * row_nbytes]
+            utils.burst_bytes_to_numpy(block_bytes, (n_block_rows, n_cols), out=block[:n_block_rows])
+            band.WriteArray(block[:n_block_rows], 0, row)
         out_dataset = None
 
     def slc_to_vrt_file(self, out_path):
         raise NotImplementedError('This method is not valid for Remote SLC objects')
 
 
-def georeference_burst(burst_instance, dem_path, output_dir, scratch_dir):
-    from compass.utils.geo_grid import generate_geogrids
+def edl_download_many(burst_list, batch_size=16):
+    # STAC bursts share absolute_id across polarizations, so results are keyed by (absolute_id, polarization)
+    auth = utils.get_netrc_auth()
+    http_fs = utils.get_https_filesystem(auth)
+    byte_ranges = [x.get_byte_range(auth) for x in burst_list]
+    ranged = [(x, y) for x, y in zip(burst_list, byte_ranges) if y is not None]
+
+    # all range reads run concurrently on fsspec's aiohttp event loop, `batch_size` requests at a time
+    burst_bytes = http_fs.cat_ranges([x.url_path for x, _ in ranged], [y[0] for _, y in ranged],
+                                     [y[1] for _, y in ranged], batch_size=batch_size, on_error='raise')
+    arrays = {(x.absolute_id, x.polarization): utils.burst_bytes_to_numpy(data, x.shape)
+              for (x, _), data in zip(ranged, burst_bytes)}
+
+    # the rare burst without a stored-member offset goes through the slower zip filesystem path
+    for burst, byte_range in zip(burst_list, byte_ranges):
+        if byte_range is None:
+            arrays[(burst.absolute_id, burst.polarization)] = burst.edl_download_data()
+    return arrays
+
+
+def georeference_burst(burst_instance, dem_path, output_dir, scratch_dir, keep_slc=False):
+    if generate_geogrids is None:
+        raise ImportError('georeference_burst requires the compass package')
+
     # set options
     threshold = 1e-08
     iters = 25
@@ -250,8 +362,20 @@ def georeference_burst(burst_instance, dem_path, output_dir, scratch_dir):
     scratch_path = f'{scratch_dir}/{burst_id}/{date_str}'
     os.makedirs(scratch_path, exist_ok=True)
 
-    temp_slc_path = f'{scratch_dir}/{burst_id}_{pol}_temp.slc'
-    burst_instance.slc_to_file(temp_slc_path)
+    # keep the radar-geometry SLC in GDAL's in-memory filesystem instead of round tripping it through disk,
+    # reusing one left by an earlier keep_slc=True call so repeated geocodes of a burst skip the download.
+    # The name carries the scene id (or full sensing time for plain s1reader bursts) so that stacks sharing
+    # a burst and date don't pick up each other's SLC.
+    scene_id = getattr(burst_instance, 'absolute_id', None) or burst_instance.sensing_start.strftime('%Y%m%dT%H%M%S')
+    temp_slc_path = f'/vsimem/{scene_id}_{burst_id}_{pol}_temp.tif'
+    if gdal.VSIStatL(temp_slc_path) is None:
+        try:
+            burst_instance.slc_to_file(temp_slc_path, fmt='GTiff')
+        except BaseException:
+            # never leave a half-written SLC behind for a later call to reuse
+            if gdal.VSIStatL(temp_slc_path) is not None:
+                gdal.Unlink(temp_slc_path)
+            raise
     rdr_burst_raster = isce3.io.Raster(temp_slc_path)
     print('data downloaded...')
 
@@ -281,17 +405,22 @@ def georeference_burst(burst_instance, dem_path, output_dir, scratch_dir):
                burst_instance.first_valid_sample:burst_instance.last_valid_sample]
 
     # Create sliced radar grid representing valid region of the burst
-    sliced_radar_grid = burst_instance.as_isce3_radargrid()[b_bounds]
-
-    # Geocode
-    isce3.geocode.geocode_slc(geo_burst_raster, rdr_burst_raster,
-                              dem_raster,
-                              radar_grid, sliced_radar_grid,
-                              geo_grid, orbit,
-                              native_doppler,
-                              image_grid_doppler, ellipsoid, threshold,
-                              iters, blocksize, flatten,
-                              azimuth_carrier=az_carrier_poly2d)
+    sliced_radar_grid = radar_grid[b_bounds]
+
+    # Geocode, releasing the in-memory SLC (unless asked to keep it) even if geocoding fails
+    try:
+        isce3.geocode.geocode_slc(geo_burst_raster, rdr_burst_raster,
+                                  dem_raster,
+                                  radar_grid, sliced_radar_grid,
+                                  geo_grid, orbit,
+                                  native_doppler,
+                                  image_grid_doppler, ellipsoid, threshold,
+                                  iters, blocksize, flatten,
+                                  azimuth_carrier=az_carrier_poly2d)
+    finally:
+        del rdr_burst_raster
+        if not keep_slc and gdal.VSIStatL(temp_slc_path) is not None:
+            gdal.Unlink(temp_slc_path)
 
     # Set geo transformation
     geotransform = [geo_grid.start_x, geo_grid.spacing_x, 0,
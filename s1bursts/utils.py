@@ -1,8 +1,11 @@
+import struct
+import zipfile
 from datetime import datetime
+from functools import lru_cache
 from netrc import netrc
-from pathlib import Path
 
 import aiohttp
+import fsspec
 import numpy as np
 
 # These constants are from the Sentinel-1 Level 1 Detailed Algorithm Definition PDF
@@ -11,36 +14,118 @@ NOMINAL_ORBITAL_DURATION = 12 * 24 * 3600 / 175
 PREAMBLE_LENGTH = 2.299849
 BEAM_CYCLE_TIME = 2.758273
 SPEED_OF_LIGHT = 299792458.0
-INTERNATIONAL_IDS = {'S1A': ' 2014-016A', 'S1B': '2016-025A'}
+INTERNATIONAL_IDS = {'S1A': '2014-016A', 'S1B': '2016-025A'}
+INTERNATIONAL_IDS_REVERSE = {v: k for k, v in INTERNATIONAL_IDS.items()}
 SCIHUB_USER = 'gnssguest'
 SCIHUB_PASSWORD = 'gnssguest'
+HTTPS_CLIENT_KWARGS = {'trust_env': True}
+DT_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
 
 
+@lru_cache(maxsize=4)
 def get_netrc_auth(auth_cls=aiohttp.BasicAuth):
+    # parse ~/.netrc once per process; the returned auth objects are immutable and hashable
     my_netrc = netrc()
     username, _, password = my_netrc.authenticators('urs.earthdata.nasa.gov')
     auth = auth_cls(username, password)
     return auth
 
 
+@lru_cache(maxsize=4)
+def get_https_filesystem(auth):
+    # one filesystem (and aiohttp connection pool) per set of credentials so EDL logins are reused across SAFEs
+    http_fs = fsspec.filesystem('https', client_kwargs={**HTTPS_CLIENT_KWARGS, 'auth': auth})
+    return http_fs
+
+
+@lru_cache(maxsize=16384)
+def parse_dt(dt_string):
+    # annotation timestamps repeat across bursts and swaths, so most calls are cache hits
+    return datetime.fromisoformat(dt_string)
+
+
 def convert_dt(dt_object):
-    dt_format = '%Y-%m-%dT%H:%M:%S.%f'
     if isinstance(dt_object, str):
-        dt = datetime.strptime(dt_object, dt_format)
+        dt = parse_dt(dt_object)
     else:
-        dt = dt_object.strftime(dt_format)
+        dt = dt_object.strftime(DT_FORMAT)
     return dt
 
 
+def get_safe_name(safe_url):
+    # plain string ops give the same result as Path(safe_url).with_suffix('.SAFE').name without building Paths
+    return safe_url.rsplit('/', 1)[-1].rsplit('.', 1)[0] + '.SAFE'
+
+
 def create_safe_path(safe_url, interior_path):
-    safe = Path(safe_url).with_suffix('.SAFE').name
-    path = Path(safe) / interior_path
-    return str(path)
+    return f'{get_safe_name(safe_url)}/{interior_path}'
+
+
+def get_stored_members(zip_file, suffix='.tiff'):
+    # compressed members can't be range read, so they are left out and callers fall back to the zip filesystem
+    return [x for x in zip_file.infolist() if x.filename.endswith(suffix) and x.compress_type == zipfile.ZIP_STORED]
+
+
+def get_member_data_offset(info, local_header_bytes):
+    # bytes of a stored member start after its local header, whose name/extra lengths can differ from the central dir
+    local_header = struct.unpack(zipfile.structFileHeader, local_header_bytes)
+    filename_length, extra_length = local_header[-2:]
+    return info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length
+
+
+def get_zip_data_offsets(zip_file, suffix='.tiff'):
+    data_offsets = {}
+    for info in get_stored_members(zip_file, suffix):
+        zip_file.fp.seek(info.header_offset)
+        data_offsets[info.filename] = get_member_data_offset(info, zip_file.fp.read(zipfile.sizeFileHeader))
+    return data_offsets
+
+
+def fetch_zip_data_offsets(fs, url, members):
+    # fetch every local header in one batched request instead of a seek and read (and readahead) per member
+    starts = [x.header_offset for x in members]
+    ends = [x + zipfile.sizeFileHeader for x in starts]
+    local_headers = fs.cat_ranges([url] * len(members), starts, ends, on_error='raise')
+    return {x.filename: get_member_data_offset(x, header) for x, header in zip(members, local_headers)}
+
+
+@lru_cache(maxsize=64)
+def get_remote_zip_data_offsets(url, auth, suffix='.tiff'):
+    # read the central directory of a remote SAFE once per process instead of once per burst. Without a
+    # readahead cache each read is a single range request for just the bytes zipfile asks for.
+    http_fs = get_https_filesystem(auth)
+    with http_fs.open(url, cache_type='none') as http_f:
+        zip_file = zipfile.ZipFile(http_f)
+        # compressed members map to None so callers can tell them apart from members that don't exist
+        data_offsets = {x.filename: None for x in zip_file.infolist() if x.filename.endswith(suffix)}
+        members = get_stored_members(zip_file, suffix)
+    return data_offsets | fetch_zip_data_offsets(http_fs, url, members)
+
+
+def get_remote_data_offset(url, interior_path, auth):
+    # None means the member is compressed and has to be read through the zip filesystem instead
+    data_offsets = get_remote_zip_data_offsets(url, auth)
+    if interior_path not in data_offsets:
+        raise FileNotFoundError(f'{interior_path} is not a member of {url}')
+    return data_offsets[interior_path]
+
+
+def read_zip_member_range(http_fs, url, interior_path, byte_offset, byte_length):
+    # slow path for compressed members, zipfile inflates the member up to the requested bytes
+    with http_fs.open(url) as http_f:
+        zip_fs = fsspec.filesystem('zip', fo=http_f)
+        with zip_fs.open(interior_path) as f:
+            f.seek(byte_offset)
+            member_bytes = f.read(byte_length)
+    return member_bytes
+
 
+def burst_bytes_to_numpy(burst_bytes, shape, out=None):
+    # measurement tiffs hold interleaved little-endian int16 I/Q pairs
+    raw_array = np.frombuffer(burst_bytes, dtype='<i2').reshape(*shape, 2)
+    if out is None:
+        out = np.empty(shape, dtype=np.csingle)
 
-def burst_bytes_to_numpy(burst_bytes, shape):
-    tmp_array = np.frombuffer(burst_bytes, dtype=np.int16).astype(float)
-    array = tmp_array.copy()
-    array.dtype = 'complex'
-    array = array.reshape(shape).astype(np.csingle)
-    return array
+    # cast straight into the real/imag lanes of the (possibly preallocated) output, no float32 temporary
+    np.copyto(out.view(np.float32).reshape(*shape, 2), raw_array, casting='unsafe')
+    return out
@@ -26,13 +26,29 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
 
-    python_requires='~=3.8',
-    #TODO
-    install_requires=[],
+    python_requires='>=3.9',
+    # s1bursts.opera additionally needs isce3, s1reader and GDAL, which are installed through conda
+    install_requires=[
+        'aiohttp',
+        'fsspec>=2022.5.0',
+        'geopandas',
+        'lxml',
+        'numcodecs>=0.12',
+        'numpy>=1.20',
+        'orjson',
+        'pandas',
+        'pqdm',
+        'pystac',
+        'requests',
+        'shapely',
+        'xarray>=2023.1,<2026.9',
+        'zarr>=2.16,<3',
+    ],
 
     extras_require={
         'develop': [
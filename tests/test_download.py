@@ -0,0 +1,80 @@
+import zipfile
+
+import numpy as np
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+from s1bursts import download, utils
+
+
+class RecordingFileSystem(LocalFileSystem):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested = []
+
+    def cat_ranges(self, paths, starts, ends, **kwargs):
+        self.requested += list(zip(starts, ends))
+        return super().cat_ranges(paths, starts, ends, **kwargs)
+
+
+def test_fetch_byte_ranges_splits_merged_blocks(tmp_path, monkeypatch):
+    safe_path = tmp_path / 'S1A_TEST.zip'
+    safe_path.write_bytes(bytes(range(256)))
+    monkeypatch.setattr(download, 'MAX_RANGE_BLOCK', 100)
+
+    # three adjacent 40 byte bursts in one swath tiff: the first two merge, the third would overflow the block
+    starts = [10, 50, 90]
+    ends = [50, 90, 130]
+    http_fs = RecordingFileSystem(skip_instance_cache=True)
+    range_bytes = download.fetch_byte_ranges(http_fs, [str(safe_path)] * 3, starts, ends, batch_size=4)
+
+    assert http_fs.requested == [(10, 90), (90, 130)]
+    assert [bytes(x) for x in range_bytes] == [bytes(range(start, end)) for start, end in zip(starts, ends)]
+
+
+class FakeAsset:
+    def __init__(self, asset):
+        self.asset = asset
+
+    def to_dict(self):
+        return self.asset
+
+
+class FakeItem:
+    def __init__(self, assets):
+        self.assets = {key: FakeAsset(value) for key, value in assets.items()}
+
+
+@pytest.fixture
+def burst_items(tmp_path, monkeypatch):
+    # one burst in a stored tiff and one in a deflated tiff of the same SAFE
+    shape = (3, 5)
+    raw = np.arange(2 * shape[0] * shape[1] * 2, dtype='<i2').reshape(2, *shape, 2)
+    safe_path = tmp_path / 'S1A_TEST.zip'
+    with zipfile.ZipFile(safe_path, 'w') as zf:
+        zf.writestr('S1A_TEST.SAFE/measurement/s1a-iw1-vv.tiff', b'header' + raw[0].tobytes())
+        zf.writestr('S1A_TEST.SAFE/measurement/s1a-iw1-vh.tiff', b'header' + raw[1].tobytes(),
+                    compress_type=zipfile.ZIP_DEFLATED)
+
+    monkeypatch.setattr(utils, 'get_https_filesystem', lambda auth: LocalFileSystem())
+    assets = {
+        pol: {'href': str(safe_path), 'interior_path': f'S1A_TEST.SAFE/measurement/s1a-iw1-{pol.lower()}.tiff',
+              'byte_offset': 6, 'byte_length': raw[0].nbytes, 'lines': shape[0], 'samples': shape[1]}
+        for pol in ('VV', 'VH')
+    }
+    expected = {'VV': raw[0, ..., 0] + 1j * raw[0, ..., 1], 'VH': raw[1, ..., 0] + 1j * raw[1, ..., 1]}
+    return FakeItem(assets), expected
+
+
+def test_edl_download_burst_numpy_reads_compressed_members(burst_items):
+    item, expected = burst_items
+    assert download.get_burst_byte_range(item.assets['VH'].to_dict(), None) is None
+    for pol in ('VV', 'VH'):
+        np.testing.assert_array_equal(download.edl_download_burst_numpy(item, None, pol), expected[pol])
+
+
+def test_get_burst_byte_range_missing_member(burst_items):
+    item, _ = burst_items
+    asset = item.assets['VV'].to_dict() | {'interior_path': 'S1A_TEST.SAFE/measurement/s1a-iw2-vv.tiff'}
+    with pytest.raises(FileNotFoundError, match='s1a-iw2-vv.tiff'):
+        download.get_burst_byte_range(asset, None)
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import fsspec
+import numpy as np
+import orjson
+import pytest
+import requests
+
+pytest.importorskip('isce3')
+pytest.importorskip('s1reader')
+pytest.importorskip('osgeo')
+
+from s1bursts import opera, utils  # noqa: E402
+
+
+@dataclass
+class LocalBurst:
+    absolute_id: str
+    polarization: str
+    url_path: str
+    shape: tuple
+    start: int
+
+    def get_byte_range(self, auth):
+        return self.start, self.start + self.shape[0] * self.shape[1] * 4
+
+
+def test_edl_download_many_keeps_each_polarization(tmp_path, monkeypatch):
+    shape = (3, 5)
+    vv = np.arange(shape[0] * shape[1] * 2, dtype='<i2').reshape(*shape, 2)
+    vh = -vv
+    safe_path = tmp_path / 'S1A_TEST.zip'
+    safe_path.write_bytes(vv.tobytes() + vh.tobytes())
+
+    monkeypatch.setattr(utils, 'get_netrc_auth', lambda: None)
+    monkeypatch.setattr(utils, 'get_https_filesystem', lambda auth: fsspec.filesystem('file'))
+
+    # both polarizations of one STAC item share its absolute_id
+    bursts = [
+        LocalBurst('S1_SLC_20220101T000000_000001_IW1', 'VV', str(safe_path), shape, 0),
+        LocalBurst('S1_SLC_20220101T000000_000001_IW1', 'VH', str(safe_path), shape, vv.nbytes),
+    ]
+    arrays = opera.edl_download_many(bursts)
+
+    assert set(arrays) == {(bursts[0].absolute_id, 'VV'), (bursts[0].absolute_id, 'VH')}
+    np.testing.assert_array_equal(arrays[(bursts[0].absolute_id, 'VV')], vv[..., 0] + 1j * vv[..., 1])
+    np.testing.assert_array_equal(arrays[(bursts[0].absolute_id, 'VH')], vh[..., 0] + 1j * vh[..., 1])
+
+
+def fake_cmr_send(requests_seen, found=None):
+    # answer at the transport level so the tests see the request exactly as it would go over the wire
+    def send(request, **kwargs):
+        requests_seen.append(request)
+        granule_urs = parse_qs(request.body)['granule_ur[]']
+        items = [{'umm': {'GranuleUR': x}} for x in granule_urs if found is None or x in found]
+        response = requests.Response()
+        response.status_code = 200
+        response._content = orjson.dumps({'items': items})
+        return response
+
+    return send
+
+
+def test_cmr_to_opera_bursts_pages_requests(monkeypatch):
+    granule_urs = [f'S1_SLC_20220101T000000_VV_{i:06}_IW1' for i in range(opera.CMR_MAX_PAGE_SIZE + 1)]
+    requests_seen = []
+    monkeypatch.setattr(opera.HTTP_SESSION, 'send', fake_cmr_send(requests_seen))
+    monkeypatch.setattr(opera, 'umm_to_opera_burst', lambda umm, remote: umm['GranuleUR'])
+
+    assert opera.cmr_to_opera_bursts('https://cmr.test/search/granules.umm_json', granule_urs) == granule_urs
+
+    # each page is a form-encoded POST with the URs in the body, never in the URL
+    assert [x.method for x in requests_seen] == ['POST', 'POST']
+    assert all(x.url == 'https://cmr.test/search/granules.umm_json' for x in requests_seen)
+    assert all(x.headers['Content-Type'] == 'application/x-www-form-urlencoded' for x in requests_seen)
+    bodies = [parse_qs(x.body) for x in requests_seen]
+    assert [x['page_size'] for x in bodies] == [[str(opera.CMR_MAX_PAGE_SIZE)], ['1']]
+    assert bodies[0]['granule_ur[]'] + bodies[1]['granule_ur[]'] == granule_urs
+
+
+def test_cmr_to_opera_bursts_reports_missing_urs(monkeypatch):
+    monkeypatch.setattr(opera.HTTP_SESSION, 'send', fake_cmr_send([], found={'FOUND-BURST'}))
+    monkeypatch.setattr(opera, 'umm_to_opera_burst', lambda umm, remote: umm['GranuleUR'])
+
+    with pytest.raises(ValueError, match='MISSING-BURST'):
+        opera.cmr_to_opera_bursts('https://cmr.test', ['FOUND-BURST', 'MISSING-BURST'])
+
+
+def make_burst_umm(data_offset):
+    attributes = {x: '1.0' for x in opera.CMR_FLOAT_ATTRIBUTES} | {x: '1' for x in opera.CMR_INT_ATTRIBUTES}
+    attributes |= {
+        'DOPPLER': '[0.0, 1.0, [0.0]]',
+        'AZIMUTH_FRAME_RATE': '[0.0, 1.0, [0.0]]',
+        'SAFE_NAME': 'S1A_IW_SLC__1SDV_20220101T000000_20220101T000030_041000_04E000_0000.SAFE',
+        'SAFE_URL': 'https://datapool.test/S1A_IW_SLC__1SDV_20220101T000000_20220101T000030_041000_04E000_0000.zip',
+        'MEASUREMENT_PATH': 'measurement/s1a-iw1-slc-vv.tiff',
+        'POLARIZATION': 'VV',
+        'OPERA_ID': 't001_000001_iw1',
+        'ASCENDING_DESCENDING': 'ASCENDING',
+        'RANGE_WINDOW_TYPE': 'HAMMING',
+        'GROUP_ID': 'S1_SLC_20220101T000000_000001_IW1',
+        'DATA_OFFSET': data_offset,
+    }
+    return {
+        'AdditionalAttributes': [{'Name': k, 'Values': [v]} for k, v in attributes.items()],
+        'TemporalExtent': {'RangeDateTime': {'BeginningDateTime': '2022-01-01T00:00:00.000000Z'}},
+        'SpatialExtent': {'HorizontalSpatialDomain': {'Geometry': {'GPolygons': [
+            {'Boundary': {'Points': [{'Longitude': 0.0, 'Latitude': 0.0}, {'Longitude': 1.0, 'Latitude': 0.0},
+                                     {'Longitude': 1.0, 'Latitude': 1.0}, {'Longitude': 0.0, 'Latitude': 0.0}]}}
+        ]}}},
+    }
+
+
+@pytest.mark.parametrize('cmr_value,data_offset', [('None', None), ('1234', 1234)])
+def test_umm_to_opera_burst_data_offset(monkeypatch, cmr_value, data_offset):
+    # stand in for the isce3/s1reader objects, only the parsed remote arguments matter here
+    fake_s1reader = SimpleNamespace(
+        s1_reader=SimpleNamespace(doppler_poly1d_to_lut2d=lambda *args: None, get_burst_orbit=lambda *args: None),
+        s1_burst_slc=SimpleNamespace(Doppler=lambda *args: None),
+    )
+    monkeypatch.setattr(opera, 'isce3', SimpleNamespace(core=SimpleNamespace(Poly1d=lambda *args: args)))
+    monkeypatch.setattr(opera, 's1reader', fake_s1reader)
+    monkeypatch.setattr(opera, 'find_orbit_url', lambda safe_name: None)
+    monkeypatch.setattr(opera, 'download_osv_list', lambda orbit_url: None)
+    monkeypatch.setattr(opera, 'RemoteSentinel1BurstSLC', lambda **kwargs: kwargs)
+
+    burst_args = opera.umm_to_opera_burst(make_burst_umm(cmr_value), remote=True)
+    assert burst_args['data_offset'] == data_offset
@@ -0,0 +1,54 @@
+import struct
+import zipfile
+
+import fsspec
+import pytest
+
+from s1bursts import utils
+
+
+@pytest.fixture
+def safe_zip(tmp_path):
+    zip_path = tmp_path / 'S1A_TEST.zip'
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('S1A_TEST.SAFE/measurement/s1a-iw1.tiff', b'iw1' * 100)
+
+        # an extra field shifts the data start past the fixed header and filename
+        info = zipfile.ZipInfo('S1A_TEST.SAFE/measurement/s1a-iw2.tiff')
+        info.extra = struct.pack('<HH', 0xCAFE, 12) + b'x' * 12
+        zf.writestr(info, b'iw2' * 100)
+
+        zf.writestr('S1A_TEST.SAFE/measurement/s1a-iw3.tiff', b'iw3' * 100, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr('S1A_TEST.SAFE/manifest.safe', b'<manifest/>')
+    return zip_path
+
+
+def check_offsets(zip_path, data_offsets):
+    # only the stored tiffs can be range read, and each offset must land on the member's first byte
+    assert set(data_offsets) == {'S1A_TEST.SAFE/measurement/s1a-iw1.tiff', 'S1A_TEST.SAFE/measurement/s1a-iw2.tiff'}
+    raw = zip_path.read_bytes()
+    with zipfile.ZipFile(zip_path) as zf:
+        for name, offset in data_offsets.items():
+            expected = zf.open(name).read()
+            assert raw[offset:offset + len(expected)] == expected
+
+
+def test_get_zip_data_offsets(safe_zip):
+    with zipfile.ZipFile(safe_zip) as zf:
+        assert zf.getinfo('S1A_TEST.SAFE/measurement/s1a-iw2.tiff').extra
+        data_offsets = utils.get_zip_data_offsets(zf)
+    check_offsets(safe_zip, data_offsets)
+
+
+def test_fetch_zip_data_offsets(safe_zip):
+    with zipfile.ZipFile(safe_zip) as zf:
+        members = utils.get_stored_members(zf)
+    data_offsets = utils.fetch_zip_data_offsets(fsspec.filesystem('file'), str(safe_zip), members)
+    check_offsets(safe_zip, data_offsets)
+
+
+def test_fetch_zip_data_offsets_raises_on_failed_read(safe_zip, tmp_path):
+    with zipfile.ZipFile(safe_zip) as zf:
+        members = utils.get_stored_members(zf)
+    with pytest.raises(FileNotFoundError):
+        utils.fetch_zip_data_offsets(fsspec.filesystem('file'), str(tmp_path / 'missing.zip'), members)